@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+## Copyright (C) 2020 David Miguel Susano Pinto <carandraug@gmail.com>
+##
+## This file is part of Microscope.
+##
+## Microscope is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## Microscope is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Microscope.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Pyro serializer that sends numpy arrays out of the pickle stream.
+
+With the plain pickle serializer, the data of each numpy array is
+copied into the pickle stream, and copied again out of the stream
+when unpickled.  Depending on the pickle protocol, there may be
+further intermediary copies.  The serializer here pickles everything
+but the array data, and appends the raw data of the arrays after the
+pickle stream.  The array data is copied once when the message is
+assembled, and once from the received message into the new arrays.
+
+The wire format is::
+
+    header | pickle stream | buffer 0 | buffer 1 | ...
+
+where the header is the length of the pickle stream, the number of
+buffers, and the length of each buffer.  The pickle stream refers to
+the buffers by their index.
+
+This serializer is registered with Pyro under the name
+:const:`SERIALIZER_NAME`.  Both ends of a connection need to have
+imported this module, which happens when importing
+:mod:`microscope.device_server` or :mod:`microscope.clients`.
+
+"""
+
+import io
+import pickle
+import struct
+import typing
+
+import numpy
+import Pyro4
+import Pyro4.util
+
+
+SERIALIZER_NAME = "microscope-pickle"
+
+_COUNTS = struct.Struct("!QQ")
+_LENGTH = struct.Struct("!Q")
+
+
+class _Pickler(pickle.Pickler):
+    """Pickler that moves contiguous numpy arrays into a buffer list."""
+
+    def __init__(self, file, protocol, buffers: typing.List[memoryview]):
+        super().__init__(file, protocol)
+        self._buffers = buffers
+
+    def persistent_id(self, obj):
+        if type(obj) is not numpy.ndarray or obj.dtype.hasobject:
+            return None
+        if obj.flags.c_contiguous:
+            order = "C"
+        elif obj.flags.f_contiguous:
+            order = "F"
+        else:
+            # Would require a copy anyway so use the standard pickle.
+            return None
+        flat = obj.reshape(-1, order=order).view(numpy.uint8)
+        self._buffers.append(memoryview(flat))
+        return (
+            "ndarray",
+            len(self._buffers) - 1,
+            obj.dtype.str,
+            obj.shape,
+            order,
+        )
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickler that creates numpy arrays from the buffer list."""
+
+    def __init__(self, file, buffers: typing.List[memoryview]):
+        super().__init__(file)
+        self._buffers = buffers
+
+    def persistent_load(self, pid):
+        kind, index, dtype, shape, order = pid
+        if kind != "ndarray":
+            raise pickle.UnpicklingError("unknown persistent id '%s'" % kind)
+        # The message data is read-only, so this is the one copy
+        # needed to return writable arrays.
+        data = bytearray(self._buffers[index])
+        return numpy.frombuffer(data, dtype=dtype).reshape(shape, order=order)
+
+
+def dumps(obj: typing.Any) -> bytes:
+    """Serialize an object with its arrays out of the pickle stream."""
+    buffers: typing.List[memoryview] = []
+    stream = io.BytesIO()
+    _Pickler(stream, Pyro4.config.PICKLE_PROTOCOL_VERSION, buffers).dump(obj)
+    header = [_COUNTS.pack(stream.tell(), len(buffers))]
+    header.extend(_LENGTH.pack(b.nbytes) for b in buffers)
+    # This join is the only copy of the array data.
+    return b"".join(header + [stream.getbuffer()] + buffers)
+
+
+def loads(data: typing.Union[bytes, bytearray, memoryview]) -> typing.Any:
+    """Deserialize an object serialized with :func:`dumps`."""
+    view = memoryview(data)
+    pickle_length, n_buffers = _COUNTS.unpack_from(view, 0)
+    offset = _COUNTS.size
+    lengths = []
+    for _ in range(n_buffers):
+        lengths.append(_LENGTH.unpack_from(view, offset)[0])
+        offset += _LENGTH.size
+    stream = view[offset : offset + pickle_length]
+    offset += pickle_length
+    buffers = []
+    for length in lengths:
+        buffers.append(view[offset : offset + length])
+        offset += length
+    return _Unpickler(io.BytesIO(stream), buffers).load()
+
+
+class NDArrayPickleSerializer(Pyro4.util.PickleSerializer):
+    """Pyro pickle serializer that sends numpy arrays out-of-band.
+
+    Type replacements, such as the ones used by Pyro's AUTOPROXY
+    feature, are shared with Pyro's own pickle serializer.
+
+    """
+
+    # Pyro serializer ids identify the serializer on the wire.  Pyro
+    # itself uses ids 1 to 7, so pick one far from those.
+    serializer_id = 77
+
+    def dumpsCall(self, obj, method, vargs, kwargs):
+        return dumps((obj, method, vargs, kwargs))
+
+    def dumps(self, data):
+        return dumps(data)
+
+    def loadsCall(self, data):
+        return loads(data)
+
+    def loads(self, data):
+        return loads(data)
+
+
+def register() -> None:
+    """Register the serializer with Pyro and accept it on daemons."""
+    if SERIALIZER_NAME not in Pyro4.util._serializers:
+        serializer = NDArrayPickleSerializer()
+        Pyro4.util._serializers[SERIALIZER_NAME] = serializer
+        Pyro4.util._serializers_by_id[serializer.serializer_id] = serializer
+    Pyro4.config.SERIALIZERS_ACCEPTED.add(SERIALIZER_NAME)
+
+
+def serializer_name_for_current_call() -> typing.Optional[str]:
+    """Name of the serializer used by the client of the current call.
+
+    This is used to call back a Pyro client, for example to send data,
+    with the same serializer that the client used.  Returns `None` if
+    not currently handling a Pyro call.
+
+    """
+    if Pyro4.current_context.client is None:
+        return None
+    serializer_id = Pyro4.current_context.serializer_id
+    for name, serializer in Pyro4.util._serializers.items():
+        if serializer.serializer_id == serializer_id:
+            return name
+    return None
@@ -37,6 +37,7 @@ import numpy
 import Pyro4
 
 import microscope
+import microscope._serializer
 
 
 _logger = logging.getLogger(__name__)
@@ -757,7 +758,16 @@ class DataDevice(Device, metaclass=abc.ABCMeta):
         """
         if new_client is not None:
             if isinstance(new_client, (str, Pyro4.core.URI)):
-                self._client = Pyro4.Proxy(new_client)
+                proxy = Pyro4.Proxy(new_client)
+                # If we are being called remotely, send the data back
+                # with the same serializer that the client used since
+                # we know it is supported by the client.
+                serializer = (
+                    microscope._serializer.serializer_name_for_current_call()
+                )
+                if serializer is not None:
+                    proxy._pyroSerializer = serializer
+                self._client = proxy
             else:
                 self._client = new_client
         else:
@@ -20,40 +20,245 @@
 """TODO: complete this docstring
 """
 
+import collections
+import copy
 import inspect
-import itertools
+import logging
 import queue
 import socket
 import threading
+import time
+import typing
+import weakref
 
+import numpy
 import Pyro4
+import Pyro4.errors
+
+import microscope._serializer
+
+
+_logger = logging.getLogger(__name__)
 
 
 # Pyro configuration. Use pickle because it can serialize numpy ndarrays.
 Pyro4.config.SERIALIZERS_ACCEPTED.add("pickle")
 Pyro4.config.SERIALIZER = "pickle"
+# Our pickle serializer that sends ndarrays out of band.  Clients use
+# it by default, see `Client.serializer`.
+microscope._serializer.register()
 
 LISTENERS = {}
 
 
+# Map of URI to the metadata (methods, attributes, and oneway methods)
+# of the remote object.  This avoids getting the metadata each time a
+# client or a proxy is created.
+_METADATA: typing.Dict[str, typing.Dict[str, typing.Set[str]]] = {}
+_METADATA_LOCK = threading.Lock()
+
+
+# Prefixes and names of methods that can be safely called again, e.g.,
+# after reconnecting to a device.
+_IDEMPOTENT_PREFIXES = ("get_", "describe_", "set_")
+_IDEMPOTENT_METHODS = {"enable", "disable", "move_to", "update_settings"}
+
+
+def _is_idempotent(name: str) -> bool:
+    return name in _IDEMPOTENT_METHODS or name.startswith(_IDEMPOTENT_PREFIXES)
+
+
+class _ProxyPool:
+    """Pyro proxies to a single remote object, one for each thread.
+
+    Pyro proxies serialise the calls from multiple threads, and
+    creating a new proxy for each call requires a new connection.
+    This keeps one proxy per thread, each with its own connection,
+    created from a template proxy so that the metadata of the remote
+    object is not fetched again.  The proxy, and its connection, are
+    closed when the thread that owns it ends.
+
+    Args:
+        uri: URI of the remote object.
+        serializer: name of the Pyro serializer for the proxies.
+        refresh: if `True`, get the remote object metadata even if
+            cached.
+
+    """
+
+    def __init__(
+        self, uri: str, serializer: str, refresh: bool = False
+    ) -> None:
+        self._template = Pyro4.Proxy(uri)
+        self._template._pyroSerializer = serializer
+        key = str(self._template._pyroUri)
+        with _METADATA_LOCK:
+            metadata = None if refresh else _METADATA.get(key)
+        if metadata is None:
+            proxy = copy.copy(self._template)
+            proxy._pyroGetMetadata()
+            metadata = {
+                "methods": set(proxy._pyroMethods),
+                "attrs": set(proxy._pyroAttrs),
+                "oneway": set(proxy._pyroOneway),
+            }
+            with _METADATA_LOCK:
+                _METADATA[key] = metadata
+        else:
+            proxy = None
+        self._template._pyroMethods = set(metadata["methods"])
+        self._template._pyroAttrs = set(metadata["attrs"])
+        self._template._pyroOneway = set(metadata["oneway"])
+
+        self._local = threading.local()
+        if proxy is not None:
+            # Already connected, use it for the current thread.
+            self._local.proxy = proxy
+        # Keep track of all proxies to release them.
+        self._proxies = weakref.WeakSet()
+        self._proxies_lock = threading.Lock()
+        if proxy is not None:
+            self._proxies.add(proxy)
+
+    @property
+    def methods(self) -> typing.Set[str]:
+        return self._template._pyroMethods
+
+    @property
+    def attrs(self) -> typing.Set[str]:
+        return self._template._pyroAttrs
+
+    def get(self) -> Pyro4.Proxy:
+        """Return the proxy for the current thread."""
+        try:
+            return self._local.proxy
+        except AttributeError:
+            proxy = copy.copy(self._template)
+            self._local.proxy = proxy
+            with self._proxies_lock:
+                self._proxies.add(proxy)
+            return proxy
+
+    def release(self) -> None:
+        """Release the connections of all proxies."""
+        with self._proxies_lock:
+            proxies = list(self._proxies)
+        for proxy in proxies:
+            proxy._pyroRelease()
+
+
 class Client:
-    """Base Client object that makes methods on proxy available locally."""
+    """Base Client object that makes methods on proxy available locally.
+
+    A client can be used from multiple threads.  Each thread makes
+    the remote calls with its own Pyro proxy, and connection, so
+    concurrent calls are not serialised.
+
+    Attributes:
+        serializer: name of the Pyro serializer used to communicate
+            with the device.  Defaults to a pickle serializer that
+            sends numpy arrays out of band to avoid copies of the
+            data.  Set it to ``"pickle"`` before constructing the
+            client if the device server is from an older version of
+            Microscope.
+        reconnect_timeout: maximum time, in seconds, to try to
+            reconnect after the connection to the device is lost, for
+            example, because the device server restarted the device.
+            Calls to idempotent methods, such as getters and setters,
+            are retried after reconnecting.  Other calls raise the
+            communication error.  If `None`, there is no reconnection.
+        reconnect_delay: time, in seconds, before the first
+            reconnection attempt.  The delay doubles after each
+            failed attempt, up to `reconnect_max_delay`.
+
+    """
+
+    serializer = microscope._serializer.SERIALIZER_NAME
+    reconnect_timeout: typing.Optional[float] = 60.0
+    reconnect_delay = 0.1
+    reconnect_max_delay = 5.0
 
     def __init__(self, url):
         self._url = url
-        self._proxy = None
+        self._proxies = None
+        self._reconnect_lock = threading.Lock()
+        # Incremented on each reconnection so that threads that see
+        # the same broken connection reconnect only once.
+        self._connection_count = 0
         self._connect()
 
-    def _connect(self):
+    @property
+    def _proxy(self) -> Pyro4.Proxy:
+        """Pyro proxy for the current thread."""
+        return self._proxies.get()
+
+    def _remote_method(self, name: str) -> typing.Callable:
+        """Create function that calls remote method with thread proxy."""
+
+        def call(*args, **kwargs):
+            connection_count = self._connection_count
+            try:
+                return getattr(self._proxies.get(), name)(*args, **kwargs)
+            except Pyro4.errors.CommunicationError as ex:
+                # Remote exceptions have a traceback and do not mean
+                # that the connection to the device was lost.
+                if self.reconnect_timeout is None or hasattr(
+                    ex, "_pyroTraceback"
+                ):
+                    raise
+                self._reconnect(connection_count)
+                if not _is_idempotent(name):
+                    raise
+            return getattr(self._proxies.get(), name)(*args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def _reconnect(self, connection_count: int) -> None:
+        """Reconnect with exponential backoff, unless already done."""
+        with self._reconnect_lock:
+            if self._connection_count != connection_count:
+                return  # Another thread already reconnected.
+            _logger.warning("lost connection to '%s', reconnecting", self._url)
+            deadline = time.monotonic() + self.reconnect_timeout
+            delay = self.reconnect_delay
+            while True:
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                try:
+                    self._connect(refresh=True)
+                    self._on_reconnect()
+                except Pyro4.errors.CommunicationError:
+                    if time.monotonic() >= deadline:
+                        raise
+                    delay = min(2 * delay, self.reconnect_max_delay)
+                else:
+                    break
+            self._connection_count += 1
+            _logger.info("reconnected to '%s'", self._url)
+
+    def _on_reconnect(self) -> None:
+        """Restore the remote state after reconnecting.
+
+        Derived classes should override this to, for example,
+        register with the device again.  Calls should be made via
+        :attr:`_proxy` and not via the client methods.
+        """
+        pass
+
+    def _connect(self, refresh: bool = False):
         """Connect to a proxy and set up self passthrough to proxy methods."""
-        self._proxy = Pyro4.Proxy(self._url)
-        self._proxy._pyroGetMetadata()
+        if self._proxies is not None:
+            self._proxies.release()
+        self._proxies = _ProxyPool(self._url, self.serializer, refresh)
 
         # Derived classes may over-ride some methods. Leave these alone.
         my_methods = [
-            m[0] for m in inspect.getmembers(self, predicate=inspect.ismethod)
+            m[0]
+            for m in inspect.getmembers(
+                self.__class__, predicate=inspect.isfunction
+            )
         ]
-        methods = set(self._proxy._pyroMethods).difference(my_methods)
+        methods = set(self._proxies.methods).difference(my_methods)
         # But in the case of propertyes, we need to inspect the class.
         my_properties = [
             m[0]
@@ -61,18 +266,119 @@ class Client:
                 self.__class__, predicate=inspect.isdatadescriptor
             )
         ]
-        properties = set(self._proxy._pyroAttrs).difference(my_properties)
+        properties = set(self._proxies.attrs).difference(my_properties)
+
+        for name in methods:
+            setattr(self, name, self._remote_method(name))
+        for name in properties:
+            setattr(self, name, getattr(self._proxy, name))
+
+
+class AcquisitionResult(typing.NamedTuple):
+    """Result of :meth:`DataClient.acquire_into`.
+
+    Attributes:
+        n_written: number of data written to the output array.
+        n_overruns: number of data received after the output array
+            was full.  These are kept in the client buffer.
 
-        for attr in itertools.chain(methods, properties):
-            setattr(self, attr, getattr(self._proxy, attr))
+    """
+
+    n_written: int
+    n_overruns: int
+
+
+class _ArraySink:
+    """Destination in a preallocated array for received data."""
+
+    def __init__(
+        self,
+        out: numpy.ndarray,
+        timestamps_out: typing.Optional[numpy.ndarray],
+    ) -> None:
+        self.out = out
+        self.timestamps_out = timestamps_out
+        self.next_index = 0
+        self.n_written = 0
+        self.n_overruns = 0
+        self.error: typing.Optional[Exception] = None
+
+    def write(self, index: int, data: typing.Any, timestamp: float) -> None:
+        data = numpy.asarray(data)
+        if data.shape != self.out.shape[1:]:
+            raise ValueError(
+                "received data with shape %s but expected %s"
+                % (data.shape, self.out.shape[1:])
+            )
+        if not numpy.can_cast(data.dtype, self.out.dtype, casting="safe"):
+            raise TypeError(
+                "received data of type %s which can't be safely cast to %s"
+                % (data.dtype, self.out.dtype)
+            )
+        self.out[index] = data
+        if self.timestamps_out is not None:
+            self.timestamps_out[index] = timestamp
+
+
+def _watch_connection(
+    client_ref: "weakref.ReferenceType[DataClient]", interval: float
+) -> None:
+    """Make a call to the client device while it should be enabled.
+
+    The call is what triggers a reconnection if the device server
+    restarted the device.
+    """
+    while True:
+        time.sleep(interval)
+        client = client_ref()
+        if client is None or not client._keep_enabled:
+            return
+        try:
+            client._remote_method("get_is_enabled")()
+        except Exception:
+            _logger.exception(
+                "failed to check connection to '%s'", client._url
+            )
+        del client
 
 
 class DataClient(Client):
-    """A client that can receive and buffer data."""
+    """A client that can receive and buffer data.
 
-    def __init__(self, url):
+    Received data is kept in a buffer until it is read with
+    :meth:`get_data` or :meth:`iter_data`.  By default, the buffer is
+    unbounded.  If a consumer falls behind, memory usage grows
+    without limit.  With `maxsize`, the buffer keeps only the most
+    recent data and the oldest is dropped.  A `maxsize` of 1 keeps
+    only the latest data.
+
+    If the connection to the device is lost, for example because the
+    device server restarted the device, the client reconnects and, if
+    it had been enabled via :meth:`enable`, registers itself with the
+    device and enables it again.  While enabled, the connection is
+    checked every `watchdog_interval` seconds so that this happens
+    even if the client is only receiving data.
+
+    Args:
+        url: URI of the remote data device.
+        maxsize: maximum number of data to keep in the buffer.  If
+            zero, the buffer is unbounded.
+
+    """
+
+    watchdog_interval = 1.0
+
+    def __init__(self, url, maxsize: int = 0):
         super().__init__(url)
-        self._buffer = queue.Queue()
+        if maxsize < 0:
+            raise ValueError("maxsize must be non-negative")
+        self._buffer = collections.deque(maxlen=(maxsize or None))
+        self._buffer_condition = threading.Condition()
+        self._n_received = 0
+        self._n_dropped = 0
+        self._sink: typing.Optional[_ArraySink] = None
+        self._keep_enabled = False
+        self._watchdog: typing.Optional[threading.Thread] = None
         # Register self with a listener.
         if self._url.split("@")[1].split(":")[0] in ["127.0.0.1", "localhost"]:
             iface = "127.0.0.1"
@@ -87,10 +393,38 @@ class DataClient(Client):
             lthread.start()
         self._client_uri = LISTENERS[iface].register(self)
 
+    @property
+    def n_received(self) -> int:
+        """Number of data received since the client was created."""
+        return self._n_received
+
+    @property
+    def n_dropped(self) -> int:
+        """Number of data dropped from the buffer before being read."""
+        return self._n_dropped
+
     def enable(self):
         """Set the client on the remote and enable it."""
         self.set_client(self._client_uri)
-        self._proxy.enable()
+        self._remote_method("enable")()
+        self._keep_enabled = True
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(
+                target=_watch_connection,
+                args=(weakref.ref(self), self.watchdog_interval),
+                daemon=True,
+            )
+            self._watchdog.start()
+
+    def disable(self):
+        """Disable the remote, it will not be enabled on reconnection."""
+        self._keep_enabled = False
+        self._remote_method("disable")()
+
+    def _on_reconnect(self) -> None:
+        if self._keep_enabled:
+            self._proxy.set_client(self._client_uri)
+            self._proxy.enable()
 
     @Pyro4.expose
     @Pyro4.oneway
@@ -98,10 +432,143 @@ class DataClient(Client):
     # Legacy naming convention.
     def receiveData(self, data, timestamp, *args):
         del args
-        self._buffer.put((data, timestamp))
+        with self._buffer_condition:
+            self._n_received += 1
+            sink = self._sink
+            index = None
+            if sink is not None and sink.error is None:
+                if sink.next_index < len(sink.out):
+                    index = sink.next_index
+                    sink.next_index += 1
+                else:
+                    sink.n_overruns += 1
+            if index is None:
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._n_dropped += 1
+                self._buffer.append((data, timestamp))
+                self._buffer_condition.notify_all()
+                return
+
+        # Oneway calls are handled in their own threads so copy the
+        # data into the output array without holding the lock.
+        try:
+            sink.write(index, data, timestamp)
+        except Exception as ex:
+            with self._buffer_condition:
+                sink.error = ex
+                self._buffer_condition.notify_all()
+        else:
+            with self._buffer_condition:
+                sink.n_written += 1
+                self._buffer_condition.notify_all()
+
+    def acquire_into(
+        self,
+        out: numpy.ndarray,
+        timestamps_out: typing.Optional[numpy.ndarray] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> AcquisitionResult:
+        """Write the received data into a preallocated array.
+
+        Each data received is written into the next element of the
+        first dimension of `out`, from the thread receiving the data,
+        until `out` is full.  This avoids keeping the data in the
+        buffer, e.g., to then stack them, and `out` can be a
+        `numpy.memmap` for acquisitions larger than memory.  The
+        device is not enabled or triggered by this method.
+
+        Data received after `out` is full is counted as an overrun
+        and kept in the buffer, to be read with :meth:`get_data`.
+
+        Args:
+            out: array whose first dimension is the number of data to
+                acquire and the other dimensions are the shape of the
+                data.
+            timestamps_out: optional array to write the timestamp of
+                each data.
+            timeout: maximum time, in seconds, to wait for `out` to
+                be filled.  If `None`, wait forever.
+
+        Returns:
+            The number of data written, which is less than the length
+            of `out` only on timeout, and the number of overruns.
+
+        Raises:
+            ValueError: if the received data does not have the shape
+                of the elements of `out`.
+            TypeError: if the received data can't be safely cast to
+                the type of `out`.
+
+        """
+        if out.ndim < 1:
+            raise ValueError("out must have at least one dimension")
+        if timestamps_out is not None and len(timestamps_out) < len(out):
+            raise ValueError("timestamps_out is shorter than out")
+        sink = _ArraySink(out, timestamps_out)
+        with self._buffer_condition:
+            if self._sink is not None:
+                raise RuntimeError("already acquiring into an array")
+            self._sink = sink
+            try:
+                self._buffer_condition.wait_for(
+                    lambda: (
+                        sink.error is not None or sink.n_written == len(out)
+                    ),
+                    timeout,
+                )
+            finally:
+                self._sink = None
+            if sink.error is not None:
+                raise sink.error
+            return AcquisitionResult(sink.n_written, sink.n_overruns)
+
+    def get_data(
+        self, timeout: typing.Optional[float] = None
+    ) -> typing.Tuple[typing.Any, float]:
+        """Remove and return the oldest data and timestamp in the buffer.
+
+        Args:
+            timeout: maximum time, in seconds, to wait for data.  If
+                `None`, wait until data arrives.
+
+        Raises:
+            queue.Empty: if no data arrived before `timeout`.
+
+        """
+        with self._buffer_condition:
+            if not self._buffer_condition.wait_for(
+                lambda: self._buffer, timeout
+            ):
+                raise queue.Empty()
+            return self._buffer.popleft()
+
+    def iter_data(
+        self, timeout: typing.Optional[float] = None
+    ) -> typing.Iterator[typing.Tuple[typing.Any, float]]:
+        """Iterate over data and timestamps as they arrive.
+
+        Args:
+            timeout: maximum time, in seconds, to wait for each data.
+                The iteration stops if no data arrives within this
+                time.  If `None`, wait forever.
+
+        """
+        while True:
+            try:
+                yield self.get_data(timeout)
+            except queue.Empty:
+                return
+
+    def clear_data(self) -> None:
+        """Drop all data in the buffer."""
+        with self._buffer_condition:
+            self._n_dropped += len(self._buffer)
+            self._buffer.clear()
 
     def trigger_and_wait(self):
         if not hasattr(self, "trigger"):
             raise Exception("Device has no trigger method.")
+        # Do not return data from a previous trigger.
+        self.clear_data()
         self.trigger()
-        return self._buffer.get(block=True)
+        return self.get_data()
@@ -35,21 +35,27 @@ where ``CONFIG-FILEPATH`` is the path for a python file that defines a
 """
 
 import argparse
+import functools
+import http.server
 import importlib.machinery
 import importlib.util
 import logging
+import logging.handlers
 import multiprocessing
+import queue
 import signal
 import sys
+import threading
 import time
 import typing
 from collections.abc import Iterable
 from logging import StreamHandler
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueListener, RotatingFileHandler
 from threading import Thread
 
 import Pyro4
 
+import microscope._serializer
 import microscope.abc
 from microscope.abc import FloatingDeviceMixin
 
@@ -67,6 +73,10 @@ if sys.platform == "darwin" and sys.version_info < (3, 8):
 # Pyro configuration. Use pickle because it can serialize numpy ndarrays.
 Pyro4.config.SERIALIZERS_ACCEPTED.add("pickle")
 Pyro4.config.SERIALIZER = "pickle"
+# Also accept our pickle serializer that sends ndarrays out of band.
+# Replies use the same serializer as the request, and data is sent to
+# clients with the same serializer they used on `set_client`.
+microscope._serializer.register()
 
 # We effectively expose all attributes of the classes since our
 # devices don't hold any private data.  The private methods are to
@@ -82,6 +92,8 @@ def device(
     port: int,
     conf: typing.Mapping[str, typing.Any] = {},
     uid: typing.Optional[str] = None,
+    metrics: bool = False,
+    metrics_port: typing.Optional[int] = None,
 ):
     """Define devices and where to serve them.
 
@@ -99,6 +111,14 @@ def device(
         uid: used to identify "floating" devices (see documentation
             for :class:`FloatingDeviceMixin`).  This must be specified
             if ``cls`` is a floating device.
+        metrics: if `True`, collect per-method metrics of the remote
+            calls to the served devices.  These are available via the
+            `get_server_metrics` method of the object served with
+            Pyro ID :const:`METRICS_PYRO_ID` (see
+            :class:`RPCMetrics`).
+        metrics_port: if not `None`, also serve the metrics in the
+            Prometheus text format via HTTP on this port.  Implies
+            ``metrics``.
 
     Example
 
@@ -125,7 +145,18 @@ def device(
             raise TypeError("uid must be specified for floating devices")
         elif not issubclass(cls, FloatingDeviceMixin) and uid is not None:
             raise TypeError("uid must not be given for non floating devices")
-    return dict(cls=cls, host=host, port=int(port), uid=uid, conf=conf)
+    if metrics_port is not None:
+        metrics = True
+        metrics_port = int(metrics_port)
+    return dict(
+        cls=cls,
+        host=host,
+        port=int(port),
+        uid=uid,
+        conf=conf,
+        metrics=metrics,
+        metrics_port=metrics_port,
+    )
 
 
 def _create_log_formatter(name: str):
@@ -148,42 +179,82 @@ def _create_log_formatter(name: str):
 
 
 class Filter(logging.Filter):
-    def __init__(self):
-        self.last = None
-        self.count = 1
-        self.aggregate_at = 3
-        self.repeat_at = 5
-        self.stop_at = self.aggregate_at + 3 * self.repeat_at
-
-    def filter(self, record):
-        """Pass, aggregate or suppress consecutive repetitions of a log message."""
-        if self.last == record.msg:
-            # Repeated message. Increment count.
-            self.count += 1
-        else:
-            # New message. We've seen 1 instance of it.
-            self.count = 1
-        # Update self.last - no further reference to last message
-        # needed in this call.
-        self.last = record.msg
-        if self.count < self.aggregate_at:
-            return True
-        elif self.count == self.aggregate_at:
-            record.msg = "Aggregating reps. of: %s" % (record.msg)
-            return True
-        elif (
-            self.stop_at > self.count > self.aggregate_at
-            and ((self.count - self.aggregate_at) % self.repeat_at) == 0
-        ):
-            record.msg = "%d times: %s" % (self.repeat_at, record.msg)
-            return True
-        elif self.count == self.stop_at:
-            record.msg = "Suppressing reps. of: %s" % (record.msg)
+    """Rate limit log records per call site.
+
+    Each call site, i.e., source file and line number, may emit up
+    to `burst` records every `period` seconds.  Further records from
+    that call site are suppressed until the next period, and the first
+    record to pass afterwards reports how many were suppressed.  This
+    keeps drivers that log on hot paths, e.g., once per frame, from
+    flooding the logs.
+
+    There are no locks.  The state of each call site is updated
+    without synchronization, so concurrent threads logging from the
+    same call site may occasionally let an extra record through or
+    miscount the suppressed records.
+
+    Args:
+        burst: number of records a call site may emit per period.
+        period: length of the period in seconds.
+
+    """
+
+    def __init__(self, burst: int = 10, period: float = 1.0) -> None:
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        # Map of call site to a list with the start of its current
+        # period, number of records passed in this period, and number
+        # of records suppressed in this period.
+        self._sites: typing.Dict[
+            typing.Tuple[str, int], typing.List[typing.Any]
+        ] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Pass or suppress a record based on its call site rate."""
+        site = (record.pathname, record.lineno)
+        state = self._sites.get(site)
+        if state is None:
+            # setdefault is atomic so that concurrent threads end up
+            # with the same state list.
+            state = self._sites.setdefault(site, [record.created, 0, 0])
+        if record.created - state[0] >= self.period:
+            suppressed = state[2]
+            state[0] = record.created
+            state[1] = 0
+            state[2] = 0
+            if suppressed:
+                # Do not add to args, msg may not be a format string.
+                record.msg = "%s [suppressed %d similar messages]" % (
+                    record.msg,
+                    suppressed,
+                )
+        if state[1] < self.burst:
+            state[1] += 1
             return True
         else:
+            state[2] += 1
             return False
 
 
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue log records without formatting them.
+
+    `logging.handlers.QueueHandler` formats the message before
+    enqueuing it because it is meant to be used with queues to other
+    processes.  Our queue is consumed by a thread on the same process
+    so we leave that work to the `QueueListener` thread.
+
+    Because formatting is deferred, the log arguments are formatted
+    after the logging call returns.  Mutable arguments modified
+    meanwhile are logged with their new value.
+
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 def _check_autoproxy_feature() -> None:
     # AUTOPROXY is enabled by default.  If it is disabled there must
     # be a reason so raise an error instead of silently enabling it.
@@ -207,18 +278,286 @@ def _check_autoproxy_feature() -> None:
     return None
 
 
-def _register_device(pyro_daemon, device, obj_id=None) -> None:
+# Pyro ID of the object with the RPC metrics of a device server.
+METRICS_PYRO_ID = "DeviceServerMetrics"
+
+
+class _MethodMetrics:
+    """Counters and latency histogram for a single exposed method."""
+
+    def __init__(self, n_buckets: int) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        # Non cumulative count for each bucket plus one for +Inf.
+        self.bucket_counts = [0] * (n_buckets + 1)
+
+
+# Marks the thread as being inside an instrumented call so that
+# nested calls, e.g., `set_roi` calling `get_sensor_shape`, are only
+# accounted once.
+_instrumented_call = threading.local()
+
+
+class RPCMetrics:
+    """Collect per-method metrics of the remote calls to served objects.
+
+    For each exposed method of the instrumented objects, this keeps
+    the number of calls, the number of calls that raised an
+    exception, and an histogram of the call latency.  Only calls
+    coming from Pyro, i.e., from a remote client, are accounted.
+    Calls made by the device itself or by nested calls are not.
+
+    Instances of this class are served by the device server with the
+    Pyro ID :const:`METRICS_PYRO_ID` so the metrics can be retrieved
+    with:
+
+    .. code-block:: python
+
+        metrics = Pyro4.Proxy("PYRO:DeviceServerMetrics@127.0.0.1:8000")
+        metrics.get_server_metrics()
+
+    Args:
+        buckets: upper bounds, in seconds, of the latency histogram
+            buckets.  A bucket for infinity is always added.
+
+    """
+
+    BUCKETS = (
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    )
+
+    def __init__(
+        self, buckets: typing.Optional[typing.Sequence[float]] = None
+    ) -> None:
+        if buckets is None:
+            buckets = self.BUCKETS
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._methods: typing.Dict[typing.Tuple[str, str], _MethodMetrics] = {}
+
+    def instrument(self, obj: typing.Any, name: str) -> None:
+        """Wrap all exposed methods of an object to collect metrics.
+
+        The methods are replaced by wrappers on the instance itself so
+        that Pyro, which looks the methods up on the instance, calls
+        the wrappers.
+
+        Args:
+            obj: object to instrument, typically a device.
+            name: name used to identify the object on the metrics,
+                typically its Pyro ID.
+
+        """
+        exposed = Pyro4.util.get_exposed_members(obj, only_exposed=False)
+        for method_name in sorted(exposed["methods"]):
+            method = getattr(obj, method_name)
+            with self._lock:
+                stats = self._methods.setdefault(
+                    (name, method_name), _MethodMetrics(len(self._buckets))
+                )
+            setattr(obj, method_name, self._wrap(method, stats))
+
+    def _wrap(
+        self, method: typing.Callable, stats: _MethodMetrics
+    ) -> typing.Callable:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if (
+                getattr(_instrumented_call, "active", False)
+                or Pyro4.current_context.client is None
+            ):
+                return method(*args, **kwargs)
+            _instrumented_call.active = True
+            failed = True
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                _instrumented_call.active = False
+                self._record(stats, elapsed, failed)
+
+        return wrapper
+
+    def _record(
+        self, stats: _MethodMetrics, elapsed: float, failed: bool
+    ) -> None:
+        idx = len(self._buckets)
+        for i, upper in enumerate(self._buckets):
+            if elapsed <= upper:
+                idx = i
+                break
+        with self._lock:
+            stats.calls += 1
+            if failed:
+                stats.errors += 1
+            stats.total_time += elapsed
+            stats.bucket_counts[idx] += 1
+
+    def get_server_metrics(
+        self,
+    ) -> typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]:
+        """Return the metrics of all instrumented objects.
+
+        Returns:
+            A map of object names to a map of method names to its
+            metrics.  The metrics of each method are a map with the
+            keys ``"calls"``, ``"errors"``, ``"total_time"`` (in
+            seconds), and ``"buckets"``.  The buckets are a list of
+            ``(upper_bound, cumulative_count)`` tuples, the last of
+            which has an upper bound of infinity.
+
+        """
+        bounds = self._buckets + (float("inf"),)
+        metrics: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        with self._lock:
+            for (obj_name, method_name), stats in self._methods.items():
+                cumulative = 0
+                buckets = []
+                for upper, count in zip(bounds, stats.bucket_counts):
+                    cumulative += count
+                    buckets.append((upper, cumulative))
+                metrics.setdefault(obj_name, {})[method_name] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "total_time": stats.total_time,
+                    "buckets": buckets,
+                }
+        return metrics
+
+    def get_prometheus_text(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+
+        def labels(obj_name: str, method_name: str) -> str:
+            def escape(value: str) -> str:
+                return (
+                    value.replace("\\", "\\\\")
+                    .replace('"', '\\"')
+                    .replace("\n", "\\n")
+                )
+
+            return 'object="%s",method="%s"' % (
+                escape(obj_name),
+                escape(method_name),
+            )
+
+        metrics = self.get_server_metrics()
+        calls = [
+            "# HELP microscope_rpc_calls_total Number of remote calls.",
+            "# TYPE microscope_rpc_calls_total counter",
+        ]
+        errors = [
+            "# HELP microscope_rpc_errors_total"
+            " Number of remote calls that raised an exception.",
+            "# TYPE microscope_rpc_errors_total counter",
+        ]
+        durations = [
+            "# HELP microscope_rpc_duration_seconds Latency of remote calls.",
+            "# TYPE microscope_rpc_duration_seconds histogram",
+        ]
+        for obj_name, methods in sorted(metrics.items()):
+            for method_name, stats in sorted(methods.items()):
+                lbl = labels(obj_name, method_name)
+                calls.append(
+                    "microscope_rpc_calls_total{%s} %d" % (lbl, stats["calls"])
+                )
+                errors.append(
+                    "microscope_rpc_errors_total{%s} %d"
+                    % (lbl, stats["errors"])
+                )
+                for upper, count in stats["buckets"]:
+                    le = "+Inf" if upper == float("inf") else repr(upper)
+                    durations.append(
+                        'microscope_rpc_duration_seconds_bucket{%s,le="%s"} %d'
+                        % (lbl, le, count)
+                    )
+                durations.append(
+                    "microscope_rpc_duration_seconds_sum{%s} %r"
+                    % (lbl, stats["total_time"])
+                )
+                durations.append(
+                    "microscope_rpc_duration_seconds_count{%s} %d"
+                    % (lbl, stats["calls"])
+                )
+        return "\n".join(calls + errors + durations) + "\n"
+
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the metrics of a device server to a Prometheus scraper."""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.rpc_metrics.get_prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        _logger.debug("metrics request: " + format, *args)
+
+
+class _MetricsHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rpc_metrics: RPCMetrics) -> None:
+        super().__init__(address, _MetricsRequestHandler)
+        self.rpc_metrics = rpc_metrics
+
+
+def _register_device(
+    pyro_daemon,
+    device,
+    obj_id=None,
+    metrics: typing.Optional[RPCMetrics] = None,
+    name: typing.Optional[str] = None,
+) -> None:
+    if name is None:
+        name = obj_id
+    if metrics is not None:
+        metrics.instrument(device, name)
     pyro_daemon.register(device, obj_id)
 
     if isinstance(device, microscope.abc.Controller):
         _check_autoproxy_feature()
-        for sub_device in device.devices.values():
-            _register_device(pyro_daemon, sub_device, obj_id=None)
+        for sub_name, sub_device in device.devices.items():
+            _register_device(
+                pyro_daemon,
+                sub_device,
+                obj_id=None,
+                metrics=metrics,
+                name="%s.%s" % (name, sub_name),
+            )
 
     if isinstance(device, microscope.abc.Stage):
         _check_autoproxy_feature()
-        for axis in device.axes.values():
-            _register_device(pyro_daemon, axis, obj_id=None)
+        for axis_name, axis in device.axes.items():
+            _register_device(
+                pyro_daemon,
+                axis,
+                obj_id=None,
+                metrics=metrics,
+                name="%s.%s" % (name, axis_name),
+            )
 
     return None
 
@@ -234,6 +573,9 @@ class DeviceServer(multiprocessing.Process):
         exit_event: a shared event to signal that the process should
             quit.
 
+    A single device server can also be signalled to quit, without
+    affecting other device servers, with :meth:`stop`.
+
     """
 
     def __init__(
@@ -251,9 +593,25 @@ class DeviceServer(multiprocessing.Process):
         self._id_to_port = id_to_port
         # A shared event to allow clean shutdown.
         self.exit_event = exit_event
+        # An event to allow clean shutdown of only this process.
+        self._stop_event = multiprocessing.Event()
         super().__init__()
         self.daemon = True
 
+    def stop(self) -> None:
+        """Signal this device server, and only this one, to quit.
+
+        The device server will shutdown its devices and exit cleanly.
+        Use `join` to wait for it.
+
+        """
+        self._stop_event.set()
+
+    def _should_exit(self) -> bool:
+        return self._stop_event.is_set() or (
+            self.exit_event is not None and self.exit_event.is_set()
+        )
+
     def clone(self):
         """Create new instance with same settings.
 
@@ -283,17 +641,27 @@ class DeviceServer(multiprocessing.Process):
         for handler in list(root_logger.handlers):
             root_logger.removeHandler(handler)
 
+        # Devices log from their acquisition threads so formatting
+        # the records and writing them to stderr and files is done
+        # on a separate thread via a queue.  The root logger only has
+        # a handler that puts the records on that queue.
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(Filter())
+        root_logger.addHandler(queue_handler)
+
         # Later, we'll log to one file per server, with a filename
         # based on a unique identifier for the device. Some devices
         # don't have UIDs available until after initialization, so
         # log to stderr until then.
         stderr_handler = StreamHandler(sys.stderr)
         stderr_handler.setFormatter(_create_log_formatter(cls_name))
-        root_logger.addHandler(stderr_handler)
+        log_listener = QueueListener(
+            log_queue, stderr_handler, respect_handler_level=True
+        )
+        log_listener.start()
         root_logger.debug("Debugging messages on.")
 
-        root_logger.addFilter(Filter())
-
         # The cls argument can either be a Device subclass, or it can
         # be a function that returns a map of names to devices.
         cls_is_type = isinstance(cls, type)
@@ -301,7 +669,7 @@ class DeviceServer(multiprocessing.Process):
         if not cls_is_type:
             self._devices = cls(**self._device_def["conf"])
         else:
-            while not self.exit_event.is_set():
+            while not self._should_exit():
                 try:
                     device = cls(**self._device_def["conf"])
                 except Exception as e:
@@ -311,6 +679,10 @@ class DeviceServer(multiprocessing.Process):
                     time.sleep(5)
                 else:
                     break
+            else:
+                # Asked to quit before the device was constructed.
+                log_listener.stop()
+                return
             self._devices = {cls_name: device}
 
         if cls_is_type and issubclass(cls, FloatingDeviceMixin):
@@ -331,11 +703,32 @@ class DeviceServer(multiprocessing.Process):
             "%s_%s_%s.log" % (cls_name, host, port)
         )
         log_handler.setFormatter(_create_log_formatter(cls_name))
-        root_logger.addHandler(log_handler)
+        # The listener thread reads this attribute for each record so
+        # replacing it is enough to add a handler.
+        log_listener.handlers = log_listener.handlers + (log_handler,)
 
         _logger.info("Device initialized; starting daemon.")
+        rpc_metrics = None
+        if self._device_def.get("metrics", False):
+            rpc_metrics = RPCMetrics()
+            pyro_daemon.register(rpc_metrics, METRICS_PYRO_ID)
         for obj_id, device in self._devices.items():
-            _register_device(pyro_daemon, device, obj_id=obj_id)
+            _register_device(
+                pyro_daemon, device, obj_id=obj_id, metrics=rpc_metrics
+            )
+
+        metrics_server = None
+        metrics_port = self._device_def.get("metrics_port", None)
+        if metrics_port is not None:
+            metrics_server = _MetricsHTTPServer(
+                (host, metrics_port), rpc_metrics
+            )
+            metrics_thread = Thread(target=metrics_server.serve_forever)
+            metrics_thread.daemon = True
+            metrics_thread.start()
+            _logger.info(
+                "Serving metrics on http://%s:%d/metrics", host, metrics_port
+            )
 
         # Run the Pyro daemon in a separate thread so that we can do
         # clean shutdown under Windows.
@@ -352,14 +745,17 @@ class DeviceServer(multiprocessing.Process):
         # Wait for termination event. We should just be able to call
         # wait() on the exit_event, but this causes issues with locks
         # in multiprocessing - see http://bugs.python.org/issue30975 .
-        while self.exit_event and not self.exit_event.is_set():
+        while self.exit_event and not self._should_exit():
             # This tread waits for the termination event.
             try:
-                time.sleep(5)
+                time.sleep(1)
             except (KeyboardInterrupt, IOError):
                 pass
         pyro_daemon.shutdown()
         pyro_thread.join()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
         for device in self._devices.values():
             try:
                 device.shutdown()
@@ -367,9 +763,239 @@ class DeviceServer(multiprocessing.Process):
                 # Catch errors so we get a chance of shutting down the
                 # other devices.
                 _logger.error("Failure to shutdown device %s", device, ex)
+        # Process any pending log records.
+        log_listener.stop()
+
+
+def _create_servers(
+    devices: typing.Iterable[typing.Mapping[str, typing.Any]],
+    exit_event: multiprocessing.Event,
+) -> typing.List[DeviceServer]:
+    """Create, but do not start, the `DeviceServer` for each device.
+
+    Each device definition is copied, and its ``conf`` gets the
+    ``index`` of the device among the devices of the same class.
+
+    """
+    # Group devices by class.
+    by_class = {}
+    for dev in devices:
+        by_class[dev["cls"]] = by_class.get(dev["cls"], []) + [dev]
+
+    servers = []
+    for cls, devs in by_class.items():
+        # Keep track of how many of these classes we have set up.
+        # Some SDKs need this information to index devices.
+        count = 0
+        # Floating devices are devices that can only be identified
+        # after having been initialized, so the constructor will
+        # return any device that it supports.  To work around this we
+        # map all device uid to host/port first.  After the
+        # DeviceServer constructs the device, it can check on the map
+        # where to serve it.  For non floating devices that
+        # information is part of the device definition, no map is
+        # needed.
+        uid_to_host = {}
+        uid_to_port = {}
+        if isinstance(cls, type) and issubclass(cls, FloatingDeviceMixin):
+            # Need to provide maps of uid to host and port.
+            for dev in devs:
+                uid = dev["uid"]
+                uid_to_host[uid] = dev["host"]
+                uid_to_port[uid] = dev["port"]
+
+        for dev in devs:
+            # Copy the definition, the conf may be shared with other
+            # definitions (the default argument of `device`), and we
+            # must not modify the definitions of running servers.
+            dev = dict(dev, conf=dict(dev["conf"], index=count))
+            servers.append(
+                DeviceServer(
+                    dev, uid_to_host, uid_to_port, exit_event=exit_event
+                )
+            )
+            count += 1
+    return servers
+
+
+def _server_key(device_def: typing.Mapping[str, typing.Any]):
+    """Identify a device definition across config files."""
+    cls = device_def["cls"]
+    if isinstance(cls, type) and issubclass(cls, FloatingDeviceMixin):
+        return (device_def["uid"],)
+    else:
+        return (device_def["host"], device_def["port"])
+
+
+def _server_name(device_def: typing.Mapping[str, typing.Any]) -> str:
+    if device_def.get("uid") is not None:
+        location = device_def["uid"]
+    else:
+        location = "%s:%d" % (device_def["host"], device_def["port"])
+    return "%s@%s" % (getattr(device_def["cls"], "__name__", "?"), location)
+
+
+def _same_definition(
+    old: typing.Mapping[str, typing.Any], new: typing.Mapping[str, typing.Any]
+) -> bool:
+    """Whether two device definitions serve the same device the same way.
+
+    When a config file is reloaded, the classes and functions defined
+    in it are new objects.  So these are compared by name and, for
+    functions, by their code.  Classes defined in the config file
+    itself are only compared by name.
+
+    """
+
+    def same_callable(a, b) -> bool:
+        if a is b:
+            return True
+        if (
+            getattr(a, "__module__", None) != getattr(b, "__module__", None)
+            or getattr(a, "__qualname__", None)
+            != getattr(b, "__qualname__", None)
+            or isinstance(a, type) != isinstance(b, type)
+        ):
+            return False
+        return getattr(a, "__code__", None) == getattr(b, "__code__", None)
+
+    if not same_callable(old["cls"], new["cls"]):
+        return False
+    for key in ["host", "port", "uid", "conf", "metrics", "metrics_port"]:
+        if old.get(key) != new.get(key):
+            return False
+    return True
+
+
+class _ServerControl:
+    """Control of the device servers, served on the main process.
+
+    Args:
+        config_fpath: path for the config file with the device
+            definitions being served.
+        servers: list of running `DeviceServer` instances.  This list
+            is modified.
+        servers_lock: lock to access the ``servers`` list.
+        exit_event: the shared event to signal that the device servers
+            should quit.
+
+    """
+
+    def __init__(
+        self,
+        config_fpath: str,
+        servers: typing.List[DeviceServer],
+        servers_lock: threading.Lock,
+        exit_event: multiprocessing.Event,
+    ) -> None:
+        self._config_fpath = config_fpath
+        self._servers = servers
+        self._servers_lock = servers_lock
+        self._exit_event = exit_event
+
+    def reload_config(self) -> typing.Dict[str, typing.List[str]]:
+        """Reload the config file and restart the changed devices.
+
+        The device definitions on the config file are compared with
+        the ones currently being served.  Only the device servers
+        whose definitions were removed or changed are stopped, and
+        only the ones whose definitions were added or changed are
+        started.  The other device servers are not disturbed.
+
+        Returns:
+            A map with the keys ``"stopped"``, ``"restarted"``, and
+            ``"started"``, each mapping to the list of names of the
+            affected device servers.
+
+        """
+        devices = validate_devices(self._config_fpath)
+        new_servers = {
+            _server_key(s._device_def): s
+            for s in _create_servers(devices, self._exit_event)
+        }
+        with self._servers_lock:
+            old_servers = {
+                _server_key(s._device_def): s for s in self._servers
+            }
+            changed = [
+                k
+                for k in old_servers.keys() & new_servers.keys()
+                if not _same_definition(
+                    old_servers[k]._device_def, new_servers[k]._device_def
+                )
+            ]
+            removed = [k for k in old_servers if k not in new_servers]
+            added = [k for k in new_servers if k not in old_servers]
+
+            # Remove them from the list of servers first, otherwise
+            # keep_alive would restart them.
+            to_stop = [old_servers[k] for k in removed + changed]
+            for server in to_stop:
+                self._servers.remove(server)
+                server.stop()
+            for server in to_stop:
+                _logger.info(
+                    "Stopping %s (PID %s) ...",
+                    _server_name(server._device_def),
+                    server.pid,
+                )
+                server.join(30)
+                if server.is_alive():
+                    _logger.error(
+                        "... PID %s did not stop, terminating it", server.pid
+                    )
+                    server.terminate()
+                    server.join()
+
+            for k in changed + added:
+                server = new_servers[k]
+                self._servers.append(server)
+                server.start()
+                _logger.info(
+                    "... started %s as PID %s",
+                    _server_name(server._device_def),
+                    server.pid,
+                )
+
+        return {
+            "stopped": [
+                _server_name(old_servers[k]._device_def) for k in removed
+            ],
+            "restarted": [
+                _server_name(new_servers[k]._device_def) for k in changed
+            ],
+            "started": [
+                _server_name(new_servers[k]._device_def) for k in added
+            ],
+        }
+
+
+# Pyro ID of the object to control the device server.
+CONTROL_PYRO_ID = "DeviceServerControl"
 
 
-def serve_devices(devices, exit_event=None):
+def serve_devices(
+    devices,
+    exit_event=None,
+    config_fpath: typing.Optional[str] = None,
+    control_port: typing.Optional[int] = None,
+):
+    """Serve devices, each on its own process.
+
+    Args:
+        devices: device definitions, see :func:`device`.
+        exit_event: event to signal that the device servers should
+            quit.  If `None`, the device servers run until a SIGINT or
+            SIGTERM is received.
+        config_fpath: path to the config file that defines
+            ``devices``.  Required to reload the config file.
+        control_port: if not `None`, serve a control object on
+            localhost at this port with Pyro ID
+            :const:`CONTROL_PYRO_ID`.  Its `reload_config` method
+            reloads the config file and restarts only the device
+            servers whose definitions have changed.
+
+    """
     root_logger = logging.getLogger()
 
     log_handler = RotatingFileHandler("__MAIN__.log")
@@ -385,6 +1011,9 @@ def serve_devices(devices, exit_event=None):
     servers = (
         []
     )  # DeviceServers instances that we need to wait for when exiting
+    # The list of servers is modified by keep_alive and by reloads of
+    # the config file.
+    servers_lock = threading.Lock()
 
     # Child processes inherit signal handling from the parent so we
     # need to make sure that only the parent process sets the exit
@@ -409,46 +1038,33 @@ def serve_devices(devices, exit_event=None):
         signal.signal(signal.SIGTERM, term_func)
         signal.signal(signal.SIGINT, term_func)
 
-    # Group devices by class.
-    by_class = {}
-    for dev in devices:
-        by_class[dev["cls"]] = by_class.get(dev["cls"], []) + [dev]
-
-    # Group devices by class.
-    if not by_class:
+    devices = list(devices)
+    if not devices:
         _logger.critical("No valid devices specified. Exiting")
         sys.exit()
 
-    for cls, devs in by_class.items():
-        # Keep track of how many of these classes we have set up.
-        # Some SDKs need this information to index devices.
-        count = 0
-        # Floating devices are devices that can only be identified
-        # after having been initialized, so the constructor will
-        # return any device that it supports.  To work around this we
-        # map all device uid to host/port first.  After the
-        # DeviceServer constructs the device, it can check on the map
-        # where to serve it.  For non floating devices that
-        # information is part of the device definition, no map is
-        # needed.
-        uid_to_host = {}
-        uid_to_port = {}
-        if isinstance(cls, type) and issubclass(cls, FloatingDeviceMixin):
-            # Need to provide maps of uid to host and port.
-            for dev in devs:
-                uid = dev["uid"]
-                uid_to_host[uid] = dev["host"]
-                uid_to_port[uid] = dev["port"]
-
-        for dev in devs:
-            dev["conf"]["index"] = count
-            servers.append(
-                DeviceServer(
-                    dev, uid_to_host, uid_to_port, exit_event=exit_event
-                )
-            )
-            servers[-1].start()
-            count += 1
+    with servers_lock:
+        servers.extend(_create_servers(devices, exit_event))
+        for server in servers:
+            server.start()
+
+    control_daemon = None
+    if control_port is not None:
+        if config_fpath is None:
+            raise ValueError("control_port requires config_fpath")
+        control_daemon = Pyro4.Daemon(host="127.0.0.1", port=control_port)
+        control_daemon.register(
+            _ServerControl(config_fpath, servers, servers_lock, exit_event),
+            CONTROL_PYRO_ID,
+        )
+        control_thread = Thread(target=control_daemon.requestLoop)
+        control_thread.daemon = True
+        control_thread.start()
+        _logger.info(
+            "Serving control on PYRO:%s@127.0.0.1:%d",
+            CONTROL_PYRO_ID,
+            control_port,
+        )
 
     # Main thread must be idle to process signals correctly, so use another
     # thread to check DeviceServers, restarting them where necessary. Define
@@ -456,38 +1072,40 @@ def serve_devices(devices, exit_event=None):
     def keep_alive():
         """Keep DeviceServers alive."""
         while not exit_event.is_set():
-            for s in servers:
-                if s.is_alive():
-                    continue
-                else:
-                    _logger.info(
-                        "DeviceServer Failure. Process %s is dead with"
-                        " exitcode %s. Restarting...",
-                        s.pid,
-                        s.exitcode,
-                    )
-                    servers.remove(s)
-                    servers.append(s.clone())
-
-                    try:
-                        s.join(30)
-                    except:
-                        _logger.error("... could not join PID %s.", s.pid)
+            with servers_lock:
+                for s in list(servers):
+                    if s.is_alive():
+                        continue
                     else:
-                        old_pid = s.pid
-                        del s
-                        servers[-1].start()
                         _logger.info(
-                            "... DeviceServer with PID %s restarted"
-                            " as PID %s.",
-                            old_pid,
-                            servers[-1].pid,
+                            "DeviceServer Failure. Process %s is dead with"
+                            " exitcode %s. Restarting...",
+                            s.pid,
+                            s.exitcode,
                         )
-            if not servers:
-                # Log and exit if no servers running. May want to change this
-                # if we add some interface to interactively restart servers.
-                _logger.info("No servers running. Exiting.")
-                exit_event.set()
+                        servers.remove(s)
+                        servers.append(s.clone())
+
+                        try:
+                            s.join(30)
+                        except:
+                            _logger.error("... could not join PID %s.", s.pid)
+                        else:
+                            old_pid = s.pid
+                            del s
+                            servers[-1].start()
+                            _logger.info(
+                                "... DeviceServer with PID %s restarted"
+                                " as PID %s.",
+                                old_pid,
+                                servers[-1].pid,
+                            )
+                if not servers:
+                    # Log and exit if no servers running. May want to
+                    # change this if we add some interface to
+                    # interactively restart servers.
+                    _logger.info("No servers running. Exiting.")
+                    exit_event.set()
             try:
                 time.sleep(5)
             except (KeyboardInterrupt, IOError):
@@ -503,6 +1121,9 @@ def serve_devices(devices, exit_event=None):
             _logger.debug("KeyboardInterrupt or IOError")
             exit_event.set()
 
+    if control_daemon is not None:
+        control_daemon.shutdown()
+
     _logger.debug("Shutting down servers ...")
     while servers:
         for s in servers:
@@ -527,6 +1148,16 @@ def _parse_cmd_line_args(args: typing.Sequence[str]) -> argparse.Namespace:
         choices=["debug", "info", "warning", "error", "critical"],
         help="Set logging level",
     )
+    parser.add_argument(
+        "--control-port",
+        action="store",
+        type=int,
+        default=None,
+        help=(
+            "Serve on localhost at this port a control object to reload"
+            " the config file and restart only the changed devices"
+        ),
+    )
     parser.add_argument(
         "config_fpath",
         action="store",
@@ -569,7 +1200,11 @@ def main(argv: typing.Sequence[str]) -> int:
 
     devices = validate_devices(args.config_fpath)
 
-    serve_devices(devices)
+    serve_devices(
+        devices,
+        config_fpath=args.config_fpath,
+        control_port=args.control_port,
+    )
 
     return 0
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+## Copyright (C) 2020 David Miguel Susano Pinto <carandraug@gmail.com>
+##
+## This file is part of Microscope.
+##
+## Microscope is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## Microscope is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Microscope.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmarks of performance sensitive code paths.
+
+These are not unit tests, they do not check for correctness and are
+not run as part of the testsuite.  They measure time, and sometimes
+memory, so that changes to performance sensitive code can be
+compared.  They can be run as a program, like so::
+
+    python -m microscope.testsuite.benchmarks [NAME ...]
+
+"""
+
+import logging
+import logging.handlers
+import os.path
+import queue
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import typing
+
+import numpy
+import Pyro4
+import Pyro4.util
+
+import microscope._serializer
+import microscope.clients
+import microscope.device_server
+
+
+def _peak_copies(func: typing.Callable[[], typing.Any], nbytes: int) -> float:
+    """Peak memory allocated while calling `func` in units of `nbytes`."""
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak / nbytes
+
+
+def benchmark_serializers(
+    shape: typing.Tuple[int, ...] = (2048, 2048),
+    dtype: typing.Any = numpy.uint16,
+    repeats: int = 20,
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    """Compare Pyro's pickle serializer with the out-of-band one.
+
+    Returns:
+        A map of serializer name to the mean time, in seconds, to
+        serialize and deserialize an image and the peak memory
+        allocated during each, in number of image sizes, i.e., an
+        approximation of the number of copies of the image data.
+
+    """
+    microscope._serializer.register()
+    image = numpy.random.randint(0, 2 ** 12, size=shape).astype(dtype)
+    results = {}
+    for name in ["pickle", microscope._serializer.SERIALIZER_NAME]:
+        serializer = Pyro4.util.get_serializer(name)
+        data = serializer.dumps(image)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            serializer.dumps(image)
+        dumps_time = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            serializer.loads(data)
+        loads_time = (time.perf_counter() - start) / repeats
+
+        results[name] = {
+            "dumps time": dumps_time,
+            "loads time": loads_time,
+            "dumps copies": _peak_copies(
+                lambda: serializer.dumps(image), image.nbytes
+            ),
+            "loads copies": _peak_copies(
+                lambda: serializer.loads(data), image.nbytes
+            ),
+        }
+    return results
+
+
+def benchmark_logging(n_records: int = 20000) -> typing.Dict[str, float]:
+    """Time per log call on a hot path with the device server handlers.
+
+    Compares handlers on the logger itself, which is how the device
+    server used to log, with the handlers on a background thread via a
+    queue, with and without rate limiting per call site.
+
+    Returns:
+        A map of setup name to the mean time, in seconds, that a call
+        to `Logger.info` blocks the calling thread.
+
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as dirpath:
+        for setup in ["direct", "queue", "queue and filter"]:
+            stream = open(os.path.join(dirpath, "stderr"), "w")
+            handlers = [
+                logging.StreamHandler(stream),
+                logging.handlers.RotatingFileHandler(
+                    os.path.join(dirpath, "device.log")
+                ),
+            ]
+            formatter = microscope.device_server._create_log_formatter("dev")
+            for handler in handlers:
+                handler.setFormatter(formatter)
+
+            logger = logging.getLogger("microscope.benchmark.%s" % setup)
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            listener = None
+            if setup == "direct":
+                for handler in handlers:
+                    logger.addHandler(handler)
+            else:
+                log_queue = queue.SimpleQueue()
+                queue_handler = microscope.device_server._QueueHandler(
+                    log_queue
+                )
+                if setup == "queue and filter":
+                    queue_handler.addFilter(microscope.device_server.Filter())
+                logger.addHandler(queue_handler)
+                listener = logging.handlers.QueueListener(log_queue, *handlers)
+                listener.start()
+
+            start = time.perf_counter()
+            for i in range(n_records):
+                logger.info("Sending image %d of shape %s", i, (512, 512))
+            results[setup] = (time.perf_counter() - start) / n_records
+
+            if listener is not None:
+                listener.stop()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            for handler in handlers:
+                handler.close()
+            stream.close()
+    return {"time per record": results}
+
+
+class _SlowService:
+    """Remote object whose method takes some time, like device I/O."""
+
+    def wait(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+def benchmark_client_threads(
+    n_threads: int = 8, n_calls: int = 20, call_time: float = 0.005
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    """Compare concurrent calls via a single Pyro proxy and a Client.
+
+    Returns:
+        A map of the setup to the total time, in seconds, for a
+        number of threads to make a number of remote calls each.
+
+    """
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(_SlowService())
+    daemon_thread = threading.Thread(target=daemon.requestLoop, daemon=True)
+    daemon_thread.start()
+
+    results = {}
+    try:
+        proxy = Pyro4.Proxy(uri)
+        client = microscope.clients.Client(uri)
+        for setup, target in [("proxy", proxy), ("client", client)]:
+
+            def calls():
+                for _ in range(n_calls):
+                    target.wait(call_time)
+
+            threads = [
+                threading.Thread(target=calls) for _ in range(n_threads)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[setup] = time.perf_counter() - start
+        proxy._pyroRelease()
+        client._proxies.release()
+    finally:
+        daemon.shutdown()
+        daemon_thread.join()
+    return {"total time": results}
+
+
+BENCHMARKS = {
+    "client-threads": benchmark_client_threads,
+    "logging": benchmark_logging,
+    "serializers": benchmark_serializers,
+}
+
+
+def main(argv: typing.Sequence[str]) -> int:
+    names = argv[1:] or list(BENCHMARKS.keys())
+    for name in names:
+        print("%s:" % name)
+        for key, values in BENCHMARKS[name]().items():
+            print("  %s:" % key)
+            for measure, value in values.items():
+                print("    %s: %g" % (measure, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
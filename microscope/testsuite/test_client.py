@@ -17,11 +17,19 @@
 ## You should have received a copy of the GNU General Public License
 ## along with Microscope.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
+import queue
+import socket
 import threading
+import time
 import unittest
+import unittest.mock
 
+import numpy
 import Pyro4
+import Pyro4.errors
 
+import microscope._serializer
 import microscope.clients
 import microscope.testsuite.devices as dummies
 
@@ -47,6 +55,12 @@ class PyroService:
     def attr(self, value):  # exposed as 'proxy.attr' writable
         self._value = value
 
+    def echo(self, value):
+        return value
+
+    def get_attr(self):
+        return self._value
+
 
 @Pyro4.expose
 class ExposedDeformableMirror(dummies.TestDeformableMirror):
@@ -99,6 +113,221 @@ class TestClient(unittest.TestCase):
         self.assertTrue(client.attr, 10)
         self.assertTrue(obj.attr, 10)
 
+    def test_ndarray_roundtrip(self):
+        """Arrays are sent and returned with the client serializer"""
+        client = (self._serve_objs([PyroService()]))[0]
+        arrays = [
+            numpy.arange(12, dtype=numpy.uint16).reshape(3, 4),
+            numpy.asfortranarray(numpy.random.rand(5, 3)),
+            numpy.arange(24).reshape(4, 6)[:, ::2],  # not contiguous
+        ]
+        echoed = client.echo({"arrays": arrays, "other": 42})
+        self.assertEqual(echoed["other"], 42)
+        for array, copy in zip(arrays, echoed["arrays"]):
+            numpy.testing.assert_array_equal(array, copy)
+            self.assertEqual(array.dtype, copy.dtype)
+            self.assertTrue(copy.flags.writeable)
+
+    def test_concurrent_calls(self):
+        """Each thread calls the remote object with its own proxy"""
+        client = (self._serve_objs([PyroService()]))[0]
+        proxies = {}
+        results = {}
+
+        def call(i):
+            results[i] = client.echo(i)
+            proxies[i] = client._proxy
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: i for i in range(4)})
+        self.assertEqual(len(set(id(p) for p in proxies.values())), 4)
+        self.assertIsNot(client._proxy, proxies[0])
+
+    def test_metadata_cached(self):
+        """A second client to the same object reuses the metadata"""
+        client = (self._serve_objs([PyroService()]))[0]
+        with unittest.mock.patch.object(
+            Pyro4.Proxy, "_pyroGetMetadata"
+        ) as get_metadata:
+            other = microscope.clients.Client(client._url)
+            get_metadata.assert_not_called()
+        self.assertEqual(other.echo(42), 42)
+
+
+class TestDataClientBuffer(unittest.TestCase):
+    def setUp(self):
+        self.daemon = Pyro4.Daemon()
+        self.uri = str(self.daemon.register(PyroService()))
+        self.thread = threading.Thread(target=self.daemon.requestLoop)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+
+    def test_unbounded(self):
+        client = microscope.clients.DataClient(self.uri)
+        for i in range(5):
+            client.receiveData(i, float(i))
+        self.assertEqual([d for d, t in client.iter_data(0)], list(range(5)))
+        self.assertEqual(client.n_received, 5)
+        self.assertEqual(client.n_dropped, 0)
+
+    def test_drop_oldest(self):
+        client = microscope.clients.DataClient(self.uri, maxsize=2)
+        for i in range(5):
+            client.receiveData(i, float(i))
+        self.assertEqual(client.get_data(), (3, 3.0))
+        self.assertEqual(client.get_data(), (4, 4.0))
+        self.assertEqual(client.n_received, 5)
+        self.assertEqual(client.n_dropped, 3)
+
+    def test_get_data_timeout(self):
+        client = microscope.clients.DataClient(self.uri, maxsize=1)
+        with self.assertRaises(queue.Empty):
+            client.get_data(timeout=0.01)
+
+    def test_iter_data_waits_for_data(self):
+        client = microscope.clients.DataClient(self.uri, maxsize=1)
+        sender = threading.Timer(0.05, client.receiveData, args=(42, 1.0))
+        sender.start()
+        self.assertEqual(list(client.iter_data(timeout=2.0)), [(42, 1.0)])
+        sender.join()
+
+    def _send_later(self, client, frames):
+        def send():
+            for i, frame in enumerate(frames):
+                client.receiveData(frame, float(i))
+
+        sender = threading.Timer(0.05, send)
+        sender.start()
+        self.addCleanup(sender.join)
+
+    def test_acquire_into(self):
+        client = microscope.clients.DataClient(self.uri)
+        frames = [numpy.full((4, 3), i, dtype=numpy.uint16) for i in range(6)]
+        out = numpy.zeros((5, 4, 3), dtype=numpy.uint16)
+        timestamps = numpy.zeros(5)
+        self._send_later(client, frames)
+        result = client.acquire_into(out, timestamps, timeout=2.0)
+        self.assertEqual(result.n_written, 5)
+        numpy.testing.assert_array_equal(out, numpy.stack(frames[:5]))
+        numpy.testing.assert_array_equal(timestamps, numpy.arange(5.0))
+
+    def test_acquire_into_timeout(self):
+        client = microscope.clients.DataClient(self.uri)
+        out = numpy.zeros((2, 4), dtype=numpy.float64)
+        self._send_later(client, [numpy.ones(4, dtype=numpy.uint8)])
+        result = client.acquire_into(out, timeout=0.5)
+        self.assertEqual(result, (1, 0))
+        numpy.testing.assert_array_equal(out, [[1, 1, 1, 1], [0, 0, 0, 0]])
+
+    def test_acquire_into_wrong_data(self):
+        client = microscope.clients.DataClient(self.uri)
+        out = numpy.zeros((2, 4), dtype=numpy.uint8)
+        self._send_later(client, [numpy.ones(3, dtype=numpy.uint8)])
+        with self.assertRaisesRegex(ValueError, "shape"):
+            client.acquire_into(out, timeout=2.0)
+        self._send_later(client, [numpy.ones(4, dtype=numpy.uint16)])
+        with self.assertRaises(TypeError):
+            client.acquire_into(out, timeout=2.0)
+
+
+def _serve_pyro_service(port: int) -> None:
+    daemon = Pyro4.Daemon(host="127.0.0.1", port=port)
+    daemon.register(PyroService(), "PyroService")
+    daemon.requestLoop()
+
+
+class TestClientReconnect(unittest.TestCase):
+    """The device server restarts devices by starting a new process."""
+
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self._start_server()
+        self.client = microscope.clients.Client(
+            "PYRO:PyroService@127.0.0.1:%d" % self.port
+        )
+        self.client.reconnect_timeout = 10.0
+
+    def tearDown(self):
+        self.client._proxies.release()
+        self.server.terminate()
+        self.server.join()
+
+    def _start_server(self):
+        self.server = multiprocessing.Process(
+            target=_serve_pyro_service, args=(self.port,)
+        )
+        self.server.start()
+        # Wait for the server to be ready.
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", self.port)).close()
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+
+    def _restart_server(self):
+        self.server.terminate()
+        self.server.join()
+        restart = threading.Timer(0.2, self._start_server)
+        restart.start()
+        self.addCleanup(restart.join)
+
+    def test_idempotent_call_retried(self):
+        self.assertEqual(self.client.get_attr(), 42)
+        self._restart_server()
+        self.assertEqual(self.client.get_attr(), 42)
+
+    def test_other_call_not_retried(self):
+        self.assertEqual(self.client.echo(1), 1)
+        self._restart_server()
+        with self.assertRaises(Pyro4.errors.CommunicationError):
+            self.client.echo(2)
+        self.assertEqual(self.client.echo(3), 3)
+
+    def test_no_reconnect(self):
+        self.client.reconnect_timeout = None
+        self._restart_server()
+        with self.assertRaises(Pyro4.errors.CommunicationError):
+            self.client.get_attr()
+
+
+class TestNDArraySerializer(unittest.TestCase):
+    def test_out_of_band(self):
+        """Array data is not part of the pickle stream"""
+        array = numpy.zeros((512, 512), dtype=numpy.uint16)
+        data = microscope._serializer.dumps([array, array[::-1]])
+        # The first array goes out of band, the second (not
+        # contiguous) through the pickle stream.
+        self.assertLess(len(data), 3 * array.nbytes)
+        self.assertGreater(len(data), 2 * array.nbytes)
+        arrays = microscope._serializer.loads(data)
+        numpy.testing.assert_array_equal(arrays[0], array)
+
+    def test_fortran_order(self):
+        array = numpy.asfortranarray(numpy.arange(6.0).reshape(2, 3))
+        copy = microscope._serializer.loads(
+            microscope._serializer.dumps(array)
+        )
+        numpy.testing.assert_array_equal(array, copy)
+        self.assertTrue(copy.flags.f_contiguous)
+
+    def test_empty_and_scalar_arrays(self):
+        for array in [numpy.zeros((0, 5)), numpy.array(3.5)]:
+            copy = microscope._serializer.loads(
+                microscope._serializer.dumps(array)
+            )
+            numpy.testing.assert_array_equal(array, copy)
+            self.assertEqual(array.shape, copy.shape)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -24,6 +24,7 @@ import tempfile
 import time
 import unittest
 import unittest.mock
+import urllib.request
 
 import Pyro4
 
@@ -192,6 +193,80 @@ class TestClashingArguments(BaseTestServeDevices):
         self.assertEqual(client.port, 7000)
 
 
+class TestReloadConfig(unittest.TestCase):
+    CONFIG = """
+from microscope.device_server import device
+from microscope.simulators import SimulatedFilterWheel
+
+DEVICES = [
+    device(SimulatedFilterWheel, "127.0.0.1", 8001, {"positions": %d}),
+    device(SimulatedFilterWheel, "127.0.0.1", 8002, {"positions": 3}),
+]
+"""
+
+    def write_config(self, positions):
+        with open(self.config_fpath, "w") as fh:
+            fh.write(self.CONFIG % positions)
+
+    @_patch_out_device_server_logs
+    def setUp(self):
+        self.dirpath = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dirpath.cleanup)
+        self.config_fpath = os.path.join(self.dirpath.name, "config.py")
+        self.write_config(3)
+        devices = microscope.device_server.validate_devices(self.config_fpath)
+        self.p = multiprocessing.Process(
+            target=microscope.device_server.serve_devices,
+            args=(devices,),
+            kwargs={"config_fpath": self.config_fpath, "control_port": 8000},
+        )
+        self.p.start()
+        time.sleep(2)
+
+    def tearDown(self):
+        self.p.terminate()
+        self.p.join(10)
+        self.assertFalse(self.p.is_alive())
+
+    def test_only_changed_devices_restart(self):
+        """Reloading the config only restarts the changed devices"""
+        wheel1 = Pyro4.Proxy("PYRO:SimulatedFilterWheel@127.0.0.1:8001")
+        wheel2 = Pyro4.Proxy("PYRO:SimulatedFilterWheel@127.0.0.1:8002")
+        wheel2.set_position(2)
+        self.assertEqual(wheel1.n_positions, 3)
+
+        self.write_config(6)
+        control = Pyro4.Proxy(
+            "PYRO:%s@127.0.0.1:8000" % microscope.device_server.CONTROL_PYRO_ID
+        )
+        control._pyroTimeout = 30
+        changes = control.reload_config()
+        self.assertEqual(
+            changes,
+            {
+                "stopped": [],
+                "restarted": ["SimulatedFilterWheel@127.0.0.1:8001"],
+                "started": [],
+            },
+        )
+        time.sleep(1)
+        wheel1._pyroRelease()
+        self.assertEqual(wheel1.n_positions, 6)
+        # The other device was not restarted so kept its position.
+        self.assertEqual(wheel2.get_position(), 2)
+
+    def test_no_changes(self):
+        """Reloading an unchanged config restarts nothing"""
+        control = Pyro4.Proxy(
+            "PYRO:%s@127.0.0.1:8000" % microscope.device_server.CONTROL_PYRO_ID
+        )
+        control._pyroTimeout = 30
+        changes = control.reload_config()
+        self.assertEqual(
+            changes, {"stopped": [], "restarted": [], "started": []}
+        )
+
+
 class TestConfigLoader(unittest.TestCase):
     def _test_load_source(self, filename):
         file_contents = "DEVICES = [1,2,3]"
@@ -219,6 +294,37 @@ class TestConfigLoader(unittest.TestCase):
         self._test_load_source("foobar")
 
 
+class TestLogFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = microscope.device_server.Filter(burst=3, period=10.0)
+
+    def make_record(self, lineno, created, msg="foo %d"):
+        record = logging.LogRecord(
+            "name", logging.INFO, "file.py", lineno, msg, (1,), None
+        )
+        record.created = created
+        return record
+
+    def test_rate_limit_per_call_site(self):
+        """Call sites are rate limited independently"""
+        passed = [
+            self.filter.filter(self.make_record(10, 0.1 * i)) for i in range(5)
+        ]
+        self.assertEqual(passed, [True] * 3 + [False] * 2)
+        # Another call site is not affected.
+        self.assertTrue(self.filter.filter(self.make_record(20, 0.6)))
+
+    def test_report_suppressed(self):
+        """First record after the period reports suppressed records"""
+        for i in range(5):
+            self.filter.filter(self.make_record(10, 0.1 * i))
+        record = self.make_record(10, 10.5)
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual(
+            record.getMessage(), "foo 1 [suppressed 2 similar messages]"
+        )
+
+
 class TestServingFloatingDevicesWithWrongUID(BaseTestDeviceServer):
     # This test will create a floating device with a UID different
     # (foo) than what appears on the config (bar).  This is what
@@ -274,5 +380,55 @@ class TestFunctionInDeviceDefinition(BaseTestDeviceServer):
         self.assertEqual(dm2.n_actuators, 20)
 
 
+class TestServingWithMetrics(BaseTestDeviceServer):
+    args = [
+        microscope.device_server.device(
+            TestFilterWheel,
+            "127.0.0.1",
+            8001,
+            {"positions": 3},
+            metrics_port=8002,
+        ),
+        {},
+        {},
+        multiprocessing.Event(),
+    ]
+
+    def test_metrics_rpc(self):
+        """Remote calls are counted per object and method"""
+        time.sleep(1)
+        wheel = Pyro4.Proxy("PYRO:SimulatedFilterWheel@127.0.0.1:8001")
+        for i in range(3):
+            wheel.set_position(i)
+        with self.assertRaises(ValueError):
+            wheel.set_position(5)
+
+        server = Pyro4.Proxy(
+            "PYRO:%s@127.0.0.1:8001" % microscope.device_server.METRICS_PYRO_ID
+        )
+        metrics = server.get_server_metrics()
+        wheel_metrics = metrics["SimulatedFilterWheel"]
+        self.assertEqual(wheel_metrics["set_position"]["calls"], 4)
+        self.assertEqual(wheel_metrics["set_position"]["errors"], 1)
+        self.assertEqual(
+            wheel_metrics["set_position"]["buckets"][-1], (float("inf"), 4)
+        )
+        self.assertEqual(wheel_metrics["get_position"]["calls"], 0)
+
+    def test_metrics_http(self):
+        """Metrics are available in Prometheus format via HTTP"""
+        time.sleep(1)
+        wheel = Pyro4.Proxy("PYRO:SimulatedFilterWheel@127.0.0.1:8001")
+        wheel.get_position()
+        with urllib.request.urlopen("http://127.0.0.1:8002/metrics") as f:
+            text = f.read().decode("utf-8")
+        labels = 'object="SimulatedFilterWheel",method="get_position"'
+        self.assertIn("microscope_rpc_calls_total{%s} 1" % labels, text)
+        self.assertIn(
+            'microscope_rpc_duration_seconds_bucket{%s,le="+Inf"} 1' % labels,
+            text,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()